@@ -2,12 +2,26 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+import time
 
 SECRET_KEY = "your-secret-key"  # Replace with a secure key in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; each +1 doubles hashing time. Existing hashes keep their own cost.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Max concurrent bcrypt operations, so login bursts can't occupy every API worker thread.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# How long a verified token -> user resolution is reused without touching the database.
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "30"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,9 +29,92 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
+
+def decode_access_token(token: str) -> dict:
+    """Verify the token signature and expiry; raises JWTError if invalid."""
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+class TokenCache:
+    """
+    Short-lived in-process cache of verified token -> user principal.
+    Entries expire after `ttl` seconds (or at the token's own expiry, if sooner)
+    and can be dropped per user, e.g. when the account is deactivated.
+
+    Callers take `version(email)` before reading the user from the database and
+    pass it to `put`; a put whose version was invalidated in the meantime is
+    dropped, so a read that raced a committed deactivation can't re-cache it.
+    """
+
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL_SECONDS, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # token: (expires_at, principal)
+        self._tokens_by_email = {}  # email: set of tokens
+        self._generations = {}  # email: bumped on every invalidate_user
+        self._epoch = 0  # bumped on every clear
+        self._lock = threading.Lock()
+
+    def version(self, email: str):
+        with self._lock:
+            return self._epoch, self._generations.get(email, 0)
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(token)
+                return None
+            return entry[1]
+
+    def put(self, token: str, principal, token_exp: Optional[float] = None, version=None):
+        if self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, time.monotonic() + (token_exp - time.time()))
+        with self._lock:
+            if version is not None and version != (self._epoch, self._generations.get(principal.email, 0)):
+                return
+            if token not in self._entries and len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))  # oldest insertion
+            self._entries[token] = (expires_at, principal)
+            self._tokens_by_email.setdefault(principal.email, set()).add(token)
+
+    def invalidate_user(self, email: str):
+        with self._lock:
+            self._generations[email] = self._generations.get(email, 0) + 1
+            for token in self._tokens_by_email.pop(email, ()):
+                self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._generations.clear()
+            self._entries.clear()
+            self._tokens_by_email.clear()
+
+    def _remove(self, token: str):
+        _, principal = self._entries.pop(token)
+        tokens = self._tokens_by_email.get(principal.email)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_email[principal.email]
+
+token_cache = TokenCache()
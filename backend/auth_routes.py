@@ -1,47 +1,123 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
+from jose import JWTError
 from datetime import timedelta
 
 from models import User
 from schemas import UserCreate, UserRead, Token, TokenData
-from auth import verify_password, get_password_hash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from database import SessionLocal
+from auth import (
+    verify_password_async, get_password_hash_async, create_access_token, decode_access_token,
+    token_cache, ACCESS_TOKEN_EXPIRE_MINUTES,
+)
+from database import SessionLocal, get_db
+from metrics import stage
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def get_user_by_email(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> UserRead:
+    """
+    Resolve the bearer token to the active user. Verified tokens are cached for a
+    few seconds (see auth.TOKEN_CACHE_TTL_SECONDS), so repeated calls skip both the
+    JWT decode and the database lookup.
+    """
+    with stage("auth"):
+        principal = token_cache.get(token)
+        if principal is not None:
+            return principal
+        try:
+            payload = decode_access_token(token)
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        email = payload.get("sub")
+        if not email:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        version = token_cache.version(email)
+        # Only open a session on a cache miss.
+        db = SessionLocal()
+        try:
+            user = get_user_by_email(db, email)
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            if not user.is_active:
+                raise HTTPException(status_code=401, detail="Inactive user")
+            principal = UserRead.model_validate(user)
+        finally:
+            db.close()
+        token_cache.put(token, principal, payload.get("exp"), version)
+        return principal
+
+# --- Token cache invalidation ---
+# Cached principals are dropped only after COMMIT, so a concurrent request can't re-cache the
+# still-committed row in between (see TokenCache.version). Changes are collected per session.
+_PENDING_EMAILS = "insightiq.invalidate_emails"
+_PENDING_CLEAR = "insightiq.invalidate_all"
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    # Pre-flush state and attribute history are still available here.
+    for target in list(session.dirty) + list(session.deleted):
+        if isinstance(target, User):
+            # Tokens are cached under the email they were issued for, which may be the pre-update value.
+            emails = session.info.setdefault(_PENDING_EMAILS, set())
+            emails.update({target.email, *inspect(target).attrs.email.history.deleted})
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_user_changes(orm_execute_state):
+    # Bulk query(User).update()/.delete() skip the flush, and the rows they touch aren't known.
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+        mapper.class_ is User for mapper in orm_execute_state.all_mappers
+    ):
+        orm_execute_state.session.info[_PENDING_CLEAR] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_users(session):
+    if session.info.pop(_PENDING_CLEAR, False):
+        token_cache.clear()
+    for email in session.info.pop(_PENDING_EMAILS, ()):
+        token_cache.invalidate_user(email)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_invalidations(session):
+    session.info.pop(_PENDING_CLEAR, None)
+    session.info.pop(_PENDING_EMAILS, None)
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: Session, email: str, password: str):
+    user = await run_in_threadpool(get_user_by_email, db, email)
+    if not user or not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
-@router.post("/register", response_model=UserRead)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
+def _create_user(db: Session, user: UserCreate, hashed_password: str):
     new_user = User(email=user.email, hashed_password=hashed_password, full_name=user.full_name)
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent registration; users.email is unique.
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
     db.refresh(new_user)
     return new_user
 
+@router.post("/register", response_model=UserRead)
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    if await run_in_threadpool(get_user_by_email, db, user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    hashed_password = await get_password_hash_async(user.password)
+    return await run_in_threadpool(_create_user, db, user, hashed_password)
+
 @router.post("/token", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
     access_token = create_access_token(data={"sub": user.email}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -0,0 +1,382 @@
+"""
+Benchmark and load generator for the InsightIQ backend.
+
+Generates synthetic CSVs of several shapes, drives every endpoint in
+dataset_routes.py through the ASGI app (SQLite database, stub embedding model
+and stub LLM client, so no network or model weights are needed) and records
+throughput, p50/p99 latency and peak RSS. Results can be saved as a baseline
+and later runs compared against it.
+
+Usage (from the backend directory):
+    python benchmark.py                          # run default shapes, print results
+    python benchmark.py --save-baseline          # run and store bench_baseline.json
+    python benchmark.py --compare                # run and fail on regressions vs baseline
+    python benchmark.py --shapes small --iterations 20 --concurrency 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from types import ModuleType, SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "bench_baseline.json")
+
+# Synthetic date columns are hourly from this timestamp.
+DATE_START = pd.Timestamp("2000-01-01")
+
+# name: (rows, columns, column mix)
+SHAPES = {
+    "small": (1_000, 8, "mixed"),
+    "medium": (20_000, 16, "mixed"),
+    "wide": (2_000, 120, "numeric"),
+    "categorical": (20_000, 10, "categorical"),
+    "large": (200_000, 12, "mixed"),
+}
+DEFAULT_SHAPES = ["small", "medium", "wide", "categorical"]
+# Prophet's uncertainty sampling needs several GB beyond this many rows, so larger shapes skip ml_forecast.
+FORECAST_MAX_ROWS = 50_000
+
+# Fraction of numeric / categorical / date columns per mix.
+MIXES = {
+    "mixed": (0.6, 0.3, 0.1),
+    "numeric": (1.0, 0.0, 0.0),
+    "categorical": (0.2, 0.7, 0.1),
+}
+
+
+def make_csv(rows: int, cols: int, mix: str, seed: int = 0) -> bytes:
+    """Build a deterministic synthetic CSV with the requested shape and column mix."""
+    rng = np.random.default_rng(seed)
+    num_frac, cat_frac, date_frac = MIXES[mix]
+    n_date = max(1 if date_frac else 0, int(cols * date_frac))
+    n_cat = int(cols * cat_frac)
+    n_num = max(2, cols - n_cat - n_date)
+    data = {}
+    for i in range(n_date):
+        # Hourly steps keep even the largest shapes inside pandas' Timestamp range (year 2262).
+        data[f"date_{i}"] = pd.date_range(DATE_START, periods=rows, freq=pd.Timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+    for i in range(n_num):
+        data[f"num_{i}"] = rng.normal(loc=100 * (i + 1), scale=15, size=rows).round(3)
+    for i in range(n_cat):
+        levels = np.array([f"c{i}_{k}" for k in range(5 + 5 * i)])
+        data[f"cat_{i}"] = levels[rng.integers(0, len(levels), size=rows)]
+    buf = BytesIO()
+    pd.DataFrame(data).to_csv(buf, index=False)
+    return buf.getvalue()
+
+
+# --- Stubs for the embedding model and the OpenAI client ---
+class StubEmbedder:
+    """Deterministic hash-based embeddings with the MiniLM output dimension."""
+    dim = 384
+
+    def encode(self, texts, show_progress_bar=False):
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "little")
+            out[i] = np.random.default_rng(seed).random(self.dim, dtype="float32")
+        return out
+
+
+class _StubCompletions:
+    def create(self, **kwargs):
+        message = SimpleNamespace(content="Stub answer.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class StubLLMClient:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_StubCompletions())
+
+
+def load_app(db_path: str):
+    """Import the app against a fresh SQLite file with the heavy dependencies stubbed."""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-stub")
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    # dataset_routes loads its SentenceTransformer at import; hand it the stub instead.
+    stub_module = ModuleType("sentence_transformers")
+    stub_module.SentenceTransformer = lambda *args, **kwargs: StubEmbedder()
+    sys.modules["sentence_transformers"] = stub_module
+    import dataset_routes
+    from main import app
+    dataset_routes.client = StubLLMClient()
+    return app
+
+
+# --- Scenarios ---
+def scenarios(columns, rows: int):
+    """(name, method, path, kwargs) for every dataset route; `{id}` is filled per dataset."""
+    nums = [c for c in columns if c.startswith("num_")]
+    cats = [c for c in columns if c.startswith("cat_")]
+    dates = [c for c in columns if c.startswith("date_")]
+    x_num, y_num = nums[0], nums[1]
+    cases = [
+        ("list_datasets", "GET", "/data/datasets", {}),
+        ("preview", "GET", "/data/datasets/{id}/preview?rows=100", {}),
+        ("summary", "GET", "/data/datasets/{id}/summary", {}),
+        ("list_insights", "GET", "/data/datasets/{id}/insights", {}),
+        ("charts_available", "GET", "/data/charts/available", {}),
+        ("create_dashboard", "POST", "/data/dashboards/", {"json": {"name": "Bench", "layout": {}}}),
+        ("list_dashboards", "GET", "/data/dashboards/", {}),
+        ("get_dashboard", "GET", "/data/dashboards/1", {}),
+        ("update_dashboard", "PUT", "/data/dashboards/1", {"json": {"name": "Bench", "layout": {"cols": 2}}}),
+        ("delete_dashboard", "DELETE", "/data/dashboards/1", {}),
+        ("ml_advanced", "POST", "/data/datasets/{id}/ml_advanced", {"json": {"type": "clustering", "params": {}}}),
+        ("ml_trend", "POST", "/data/datasets/{id}/ml_insight", {"json": {"type": "trend", "x": x_num, "y": y_num}}),
+        ("ml_regression", "POST", "/data/datasets/{id}/ml_insight",
+         {"json": {"type": "regression", "x": x_num, "y": y_num, "params": {"degree": 2}}}),
+        ("ml_scatter", "POST", "/data/datasets/{id}/ml_insight", {"json": {"type": "scatter", "x": x_num, "y": y_num}}),
+        ("ml_histogram", "POST", "/data/datasets/{id}/ml_insight", {"json": {"type": "histogram", "x": x_num, "y": y_num}}),
+        ("ml_boxplot", "POST", "/data/datasets/{id}/ml_insight",
+         {"json": {"type": "boxplot", "x": x_num, "y": y_num, "params": {"by": cats[0] if cats else None}}}),
+        ("deepqa_prepare", "POST", "/data/datasets/{id}/deepqa_prepare", {}),
+        ("ask_question", "POST", "/data/datasets/{id}/ask_question", {"json": {"question": f"What drives {y_num}?"}}),
+    ]
+    bar = {"x": (cats or nums)[0], "y": y_num, "chart_type": "bar"}
+    if dates:
+        # A bar chart draws one bar per row, so use the date-range filter to keep it dashboard-sized.
+        bar["filter"] = {
+            "dateCol": dates[0],
+            "start": DATE_START.strftime("%Y-%m-%d %H:%M:%S"),
+            "end": (DATE_START + pd.Timedelta(hours=47)).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    cases.append(("insight_bar", "POST", "/data/datasets/{id}/insights", {"json": bar}))
+    if dates:
+        cases.append(("insight_line", "POST", "/data/datasets/{id}/insights",
+                      {"json": {"x": dates[0], "y": y_num, "chart_type": "line"}}))
+    if dates and rows <= FORECAST_MAX_ROWS:
+        cases.append(("ml_forecast", "POST", "/data/datasets/{id}/ml_insight",
+                      {"json": {"type": "forecast", "x": dates[0], "y": y_num, "params": {"periods": 12, "freq": "D"}}}))
+    return cases
+
+
+def measure(fn, iterations: int, concurrency: int, warmup: int = 1):
+    """Call `fn(i)` `iterations` times across `concurrency` threads; return latency stats."""
+    for i in range(warmup):
+        fn(-1 - i)
+
+    def timed(i):
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, range(iterations)))
+    else:
+        latencies = [timed(i) for i in range(iterations)]
+    wall = time.perf_counter() - wall_start
+    latencies.sort()
+    return {
+        "n": iterations,
+        "throughput_rps": iterations / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far in MB, or None if it can't be measured."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def check(response, name):
+    if response.status_code >= 400:
+        raise RuntimeError(f"{name} failed with {response.status_code}: {response.text[:200]}")
+    return response
+
+
+def run(shape_names, iterations: int, concurrency: int):
+    from fastapi.testclient import TestClient
+
+    db_dir = tempfile.mkdtemp(prefix="insightiq-bench-")
+    app = load_app(os.path.join(db_dir, "bench.db"))
+    results = {}
+    with TestClient(app) as client:
+        check(client.post("/auth/register", json={"email": "bench@example.com", "password": "bench-password"}), "register")
+        token = check(client.post("/auth/token", data={"username": "bench@example.com", "password": "bench-password"}), "login").json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        results.update(bench_auth(client, headers, iterations, concurrency))
+        results.update(bench_listing(client, headers, iterations, concurrency))
+
+        for shape in shape_names:
+            rows, cols, mix = SHAPES[shape]
+            csv = make_csv(rows, cols, mix)
+            columns = pd.read_csv(BytesIO(csv), nrows=0).columns.tolist()
+            print(f"[{shape}] {rows} rows x {len(columns)} cols ({mix}, {len(csv) / 1e6:.1f} MB)", file=sys.stderr)
+
+            uploaded = []
+
+            def upload(i):
+                r = check(client.post("/data/upload", files={"file": (f"{shape}.csv", csv, "text/csv")}, data={"name": f"{shape}-{i}"}, headers=headers), "upload")
+                uploaded.append(r.json()["id"])
+
+            results[f"{shape}/upload"] = measure(upload, iterations, concurrency)
+            dataset_id = uploaded[0]
+
+            if rows > FORECAST_MAX_ROWS:
+                print(f"[{shape}] skipping ml_forecast above {FORECAST_MAX_ROWS} rows", file=sys.stderr)
+            for name, method, path, kwargs in scenarios(columns, rows):
+                url = path.replace("{id}", str(dataset_id))
+                results[f"{shape}/{name}"] = measure(
+                    lambda i: check(client.request(method, url, headers=headers, **kwargs), name),
+                    iterations, concurrency,
+                )
+
+            # Delete every extra copy created by the upload benchmark, then the benchmarked dataset.
+            extras = [d for d in uploaded if d != dataset_id]
+            results[f"{shape}/delete_dataset"] = measure(
+                lambda i: check(client.delete(f"/data/datasets/{extras.pop()}", headers=headers), "delete"),
+                min(iterations, len(extras) - 1), concurrency,
+            )
+            for remaining in extras + [dataset_id]:
+                client.delete(f"/data/datasets/{remaining}", headers=headers)
+    # The OS only tracks a lifetime peak, so this covers the whole run (all selected shapes).
+    peak = peak_rss_mb()
+    if peak is not None:
+        results["process/peak_rss_mb"] = {"peak_rss_mb": peak}
+    return results
+
+
+def bench_auth(client, headers, iterations: int, concurrency: int):
+    """Login cost and per-request auth overhead with a warm vs. cold token cache."""
+    from auth import token_cache
+
+    credentials = {"username": "bench@example.com", "password": "bench-password"}
+    # /data/dashboards/ is a stub, so its latency is almost entirely authentication.
+    probe = lambda i: check(client.get("/data/dashboards/", headers=headers), "auth probe")
+
+    def cold(i):
+        token_cache.clear()
+        probe(i)
+
+    return {
+        "auth/login": measure(lambda i: check(client.post("/auth/token", data=credentials), "login"), iterations, concurrency),
+        "auth/request_cached": measure(probe, iterations * 10, concurrency),
+        "auth/request_uncached": measure(cold, iterations * 10, concurrency),
+    }
+
+
+def bench_listing(client, headers, iterations: int, concurrency: int, count: int = 1000):
+    """List `count` datasets (each with a real CSV body) in full and paginated."""
+    from database import SessionLocal
+    from models import Dataset, User
+
+    csv = make_csv(*SHAPES["small"])
+    db = SessionLocal()
+    try:
+        owner_id = db.query(User.id).filter(User.email == "bench@example.com").scalar()
+        db.add_all([Dataset(name=f"listing-{i}", content=csv, owner_id=owner_id) for i in range(count)])
+        db.commit()
+        results = {
+            f"listing/list_{count}": measure(lambda i: check(client.get("/data/datasets", headers=headers), "list"), iterations, concurrency),
+            "listing/list_page_50": measure(
+                lambda i: check(client.get("/data/datasets?limit=50&offset=100", headers=headers), "list page"), iterations, concurrency,
+            ),
+        }
+        db.query(Dataset).filter(Dataset.name.like("listing-%")).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return results
+
+
+def compare(results, baseline, threshold: float):
+    """Return a list of human-readable regressions (p50/p99 slower or RSS higher than threshold)."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p99_ms", "peak_rss_mb"):
+            if metric in current and previous.get(metric):
+                ratio = current[metric] / previous[metric]
+                if ratio > 1 + threshold:
+                    regressions.append(f"{key} {metric}: {previous[metric]:.1f} -> {current[metric]:.1f} ({ratio:.2f}x)")
+    return regressions
+
+
+def print_table(results, baseline=None):
+    print(f"{'benchmark':40} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9} {'base p50':>9}")
+    for key, r in results.items():
+        if "peak_rss_mb" in r:
+            print(f"{key:40} peak RSS {r['peak_rss_mb']:.1f} MB")
+            continue
+        base = (baseline or {}).get(key, {}).get("p50_ms")
+        base_s = f"{base:9.2f}" if base else f"{'-':>9}"
+        print(f"{key:40} {r['throughput_rps']:9.2f} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} {base_s}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="InsightIQ backend benchmark")
+    parser.add_argument("--shapes", nargs="+", default=DEFAULT_SHAPES, choices=sorted(SHAPES))
+    parser.add_argument("--iterations", type=int, default=5, help="Requests per endpoint and shape")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent client threads")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Exit non-zero on regressions vs the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--output", help="Also write this run's results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.shapes, max(2, args.iterations), args.concurrency)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    if args.compare:
+        if baseline is None:
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            return 1
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Body, status
-from sqlalchemy.orm import Session
-from fastapi.security import OAuth2PasswordBearer
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Body, Response, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session, undefer
+from typing import List, Optional
 import pandas as pd
 from io import BytesIO
 import matplotlib.pyplot as plt
@@ -19,71 +19,89 @@ import openai
 from openai import OpenAI
 from pydantic import BaseModel
 
-from models import Dataset, User, Insight
-from schemas import DatasetRead, DatasetPreview, InsightRead
-from database import SessionLocal
-from auth import verify_password
+from models import Dataset, Insight
+from schemas import DatasetRead, DatasetPreview, InsightRead, UserRead
+from database import get_db
+from auth_routes import get_current_user
+from metrics import stage
 
 # Force Matplotlib to use the 'Agg' backend to suppress GUI warnings and ensure headless image generation.
 matplotlib.use("Agg")
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(token: str = Depends(OAuth2PasswordBearer(tokenUrl="/auth/token")), db: Session = Depends(get_db)):
-    # Minimal JWT decode for user id/email (expand for production)
-    from jose import jwt
-    from auth import SECRET_KEY, ALGORITHM
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        user = db.query(User).filter(User.email == email).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
+def get_owned_dataset(db: Session, dataset_id: int, owner_id: int, with_content: bool = False):
+    """Fetch a dataset owned by `owner_id`; the CSV blob is only loaded when `with_content` is set."""
+    query = db.query(Dataset).filter(Dataset.id == dataset_id, Dataset.owner_id == owner_id)
+    if with_content:
+        query = query.options(undefer(Dataset.content))
+    with stage("db_fetch") as s:
+        dataset = query.first()
+        if dataset is not None and with_content:
+            s.bytes = len(dataset.content)
+    return dataset
 
 @router.post("/upload", response_model=DatasetRead)
 def upload_csv(
     file: UploadFile = File(...),
     name: str = Form(None),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: UserRead = Depends(get_current_user)
 ):
-    content = file.file.read()
+    with stage("read") as s:
+        content = file.file.read()
+        s.bytes = len(content)
     dataset_name = name if name else file.filename
     dataset = Dataset(name=dataset_name, content=content, owner_id=user.id)
-    db.add(dataset)
-    db.commit()
-    db.refresh(dataset)
-    return dataset
+    with stage("db_write", len(content)):
+        db.add(dataset)
+        db.commit()
+        db.refresh(dataset)
+    return DatasetRead(id=dataset.id, name=dataset.name, uploaded_at=dataset.uploaded_at, size_bytes=len(content))
 
 @router.get("/datasets", response_model=List[DatasetRead])
-def list_datasets(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    return db.query(Dataset).filter(Dataset.owner_id == user.id).order_by(Dataset.uploaded_at.desc()).all()
+def list_datasets(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Max datasets to return (default: all)"),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    user: UserRead = Depends(get_current_user)
+):
+    """
+    List the user's datasets, newest first, without loading their contents.
+    Each entry includes `size_bytes`; the total count is returned in `X-Total-Count`.
+    """
+    with stage("db_fetch"):
+        total = db.query(func.count(Dataset.id)).filter(Dataset.owner_id == user.id).scalar()
+        response.headers["X-Total-Count"] = str(total)
+        query = (
+            db.query(Dataset.id, Dataset.name, Dataset.uploaded_at, func.length(Dataset.content).label("size_bytes"))
+            .filter(Dataset.owner_id == user.id)
+            .order_by(Dataset.uploaded_at.desc(), Dataset.id.desc())
+            .offset(offset)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
 
 @router.get("/datasets/{dataset_id}/preview", response_model=DatasetPreview)
-def preview_dataset(dataset_id: int, rows: int = Query(10, ge=1, le=100), db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    dataset = db.query(Dataset).filter(Dataset.id == dataset_id, Dataset.owner_id == user.id).first()
+def preview_dataset(dataset_id: int, rows: int = Query(10, ge=1, le=100), db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
+    dataset = get_owned_dataset(db, dataset_id, user.id, with_content=True)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
-    df = pd.read_csv(BytesIO(dataset.content))
+    with stage("parse", len(dataset.content)):
+        df = pd.read_csv(BytesIO(dataset.content))
     preview = df.head(rows)
     return {"columns": list(preview.columns), "rows": preview.values.tolist()}
 
 @router.get("/datasets/{dataset_id}/insights", response_model=List[InsightRead])
-def list_insights(dataset_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    dataset = db.query(Dataset).filter(Dataset.id == dataset_id, Dataset.owner_id == user.id).first()
+def list_insights(dataset_id: int, db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
+    dataset = get_owned_dataset(db, dataset_id, user.id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
-    return dataset.insights
+    # Query insights directly so their chart blobs load in one round-trip rather than lazily.
+    with stage("db_fetch"):
+        return db.query(Insight).options(undefer(Insight.chart)).filter(Insight.dataset_id == dataset.id).order_by(Insight.id).all()
 
 @router.post("/datasets/{dataset_id}/insights")
 def create_insight(
@@ -94,39 +112,45 @@ def create_insight(
     params: dict = Body({}, description="Optional parameters for the chart"),
     filter: dict = Body(None, description="Optional filter for date/time range"),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: UserRead = Depends(get_current_user)
 ):
-    dataset = db.query(Dataset).filter(Dataset.id == dataset_id, Dataset.owner_id == user.id).first()
+    dataset = get_owned_dataset(db, dataset_id, user.id, with_content=True)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
     try:
-        df = pd.read_csv(BytesIO(dataset.content))
+        with stage("parse", len(dataset.content)):
+            df = pd.read_csv(BytesIO(dataset.content))
         if x not in df.columns or y not in df.columns:
             raise HTTPException(status_code=400, detail=f"Column {x} or {y} not found in dataset")
         # --- Filter by date/time range if provided ---
-        if filter and filter.get('dateCol') and filter.get('start') and filter.get('end'):
-            col = filter['dateCol']
-            start = filter['start']
-            end = filter['end']
-            if col in df.columns:
-                df = df[(df[col] >= start) & (df[col] <= end)]
-        fig, ax = plt.subplots()
-        # Convert x to string for line charts if it's numeric (e.g., year)
-        if chart_type == 'line' and pd.api.types.is_numeric_dtype(df[x]):
-            df[x] = df[x].astype(str)
-        if chart_type == 'bar':
-            df.plot.bar(x=x, y=y, ax=ax)
-        elif chart_type == 'line':
-            df.plot.line(x=x, y=y, ax=ax)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported chart type")
-        buf = BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close(fig)
-        chart_bytes = buf.getvalue()
+        with stage("compute"):
+            if filter and filter.get('dateCol') and filter.get('start') and filter.get('end'):
+                col = filter['dateCol']
+                start = filter['start']
+                end = filter['end']
+                if col in df.columns:
+                    df = df[(df[col] >= start) & (df[col] <= end)]
+        with stage("render") as s:
+            fig, ax = plt.subplots()
+            # Convert x to string for line charts if it's numeric (e.g., year)
+            if chart_type == 'line' and pd.api.types.is_numeric_dtype(df[x]):
+                df[x] = df[x].astype(str)
+            if chart_type == 'bar':
+                df.plot.bar(x=x, y=y, ax=ax)
+            elif chart_type == 'line':
+                df.plot.line(x=x, y=y, ax=ax)
+            else:
+                plt.close(fig)
+                raise HTTPException(status_code=400, detail="Unsupported chart type")
+            buf = BytesIO()
+            plt.savefig(buf, format='png')
+            plt.close(fig)
+            chart_bytes = buf.getvalue()
+            s.bytes = len(chart_bytes)
         summary = f"{chart_type.title()} chart of {y} vs {x}"
         import base64
-        chart_b64 = base64.b64encode(chart_bytes).decode('utf-8')
+        with stage("encode", len(chart_bytes)):
+            chart_b64 = base64.b64encode(chart_bytes).decode('utf-8')
         return {
             "summary": summary,
             "chart": chart_b64
@@ -142,13 +166,14 @@ def create_ml_insight(
     y: str = Body(..., description="Y column name"),
     params: dict = Body({}, description="Optional parameters for the model/chart"),
     db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    user: UserRead = Depends(get_current_user)
 ):
-    dataset = db.query(Dataset).filter(Dataset.id == dataset_id, Dataset.owner_id == user.id).first()
+    dataset = get_owned_dataset(db, dataset_id, user.id, with_content=True)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
     try:
-        df = pd.read_csv(BytesIO(dataset.content))
+        with stage("parse", len(dataset.content)):
+            df = pd.read_csv(BytesIO(dataset.content))
         if x not in df.columns or y not in df.columns:
             raise HTTPException(status_code=400, detail=f"Column {x} or {y} not found in dataset")
         # --- Fix: Convert year-like columns to int for axis if possible (robust) ---
@@ -163,86 +188,100 @@ def create_ml_insight(
             if 'year' in col.lower():
                 fix_year_axis(col)
         # --- End fix ---
-        fig, ax = plt.subplots()
-        summary = ""
-        model_info = {}
-        # --- Trend (Linear Regression) ---
-        if type == 'trend':
-            X = df[[x]].values.reshape(-1, 1)
-            y_vals = df[y].values
-            reg = LinearRegression().fit(X, y_vals)
-            y_pred = reg.predict(X)
-            ax.scatter(df[x], y_vals, label='Data')
-            ax.plot(df[x], y_pred, color='red', label='Trend')
-            ax.set_title('Trend (Linear Regression)')
-            ax.legend()
-            summary = f"Linear regression: y = {reg.coef_[0]:.3f}x + {reg.intercept_:.3f}"
-            model_info = {"coef": reg.coef_[0], "intercept": reg.intercept_}
-        # --- Forecast (Prophet) ---
-        elif type == 'forecast':
-            periods = int(params.get('periods', 12))
-            freq = params.get('freq', 'M')
-            prophet_df = df[[x, y]].rename(columns={x: 'ds', y: 'y'})
-            m = Prophet()
-            m.fit(prophet_df)
-            future = m.make_future_dataframe(periods=periods, freq=freq)
-            forecast = m.predict(future)
-            m.plot(forecast, ax=ax)
-            ax.set_title('Forecast (Prophet)')
-            summary = f"Forecast for {periods} periods using Prophet."
-            model_info = {"periods": periods, "freq": freq}
-        # --- Regression (Scatter + Regression Line) ---
-        elif type == 'regression':
-            degree = int(params.get('degree', 1))
-            X = df[[x]].values.reshape(-1, 1)
-            y_vals = df[y].values
-            if degree == 1:
+        # Fit models first, then draw, so the stage breakdown separates model time from Matplotlib time.
+        with stage("compute"):
+            summary = ""
+            model_info = {}
+            # --- Trend (Linear Regression) ---
+            if type == 'trend':
+                X = df[[x]].values.reshape(-1, 1)
+                y_vals = df[y].values
                 reg = LinearRegression().fit(X, y_vals)
                 y_pred = reg.predict(X)
                 summary = f"Linear regression: y = {reg.coef_[0]:.3f}x + {reg.intercept_:.3f}"
                 model_info = {"coef": reg.coef_[0], "intercept": reg.intercept_}
+            # --- Forecast (Prophet) ---
+            elif type == 'forecast':
+                periods = int(params.get('periods', 12))
+                freq = params.get('freq', 'M')
+                prophet_df = df[[x, y]].rename(columns={x: 'ds', y: 'y'})
+                m = Prophet()
+                m.fit(prophet_df)
+                future = m.make_future_dataframe(periods=periods, freq=freq)
+                forecast = m.predict(future)
+                summary = f"Forecast for {periods} periods using Prophet."
+                model_info = {"periods": periods, "freq": freq}
+            # --- Regression (Scatter + Regression Line) ---
+            elif type == 'regression':
+                degree = int(params.get('degree', 1))
+                X = df[[x]].values.reshape(-1, 1)
+                y_vals = df[y].values
+                if degree == 1:
+                    reg = LinearRegression().fit(X, y_vals)
+                    y_pred = reg.predict(X)
+                    summary = f"Linear regression: y = {reg.coef_[0]:.3f}x + {reg.intercept_:.3f}"
+                    model_info = {"coef": reg.coef_[0], "intercept": reg.intercept_}
+                else:
+                    poly = np.poly1d(np.polyfit(df[x], y_vals, degree))
+                    y_pred = poly(df[x])
+                    summary = f"Polynomial regression (deg {degree}): {poly}"
+                    model_info = {"poly_coeffs": poly.coefficients.tolist()}
+            # --- Scatter Plot ---
+            elif type == 'scatter':
+                color = params.get('color', 'blue')
+                summary = f"Scatter plot of {y} vs {x}."
+                model_info = {"color": color}
+            # --- Histogram ---
+            elif type == 'histogram':
+                bins = int(params.get('bins', 10))
+                summary = f"Histogram of {x} with {bins} bins."
+                model_info = {"bins": bins}
+            # --- Boxplot ---
+            elif type == 'boxplot':
+                by = params.get('by')
+                if by and by in df.columns:
+                    summary = f"Boxplot of {y} by {by}."
+                    model_info = {"by": by}
+                else:
+                    by = None
+                    summary = f"Boxplot of {y}."
+                    model_info = {}
             else:
-                poly = np.poly1d(np.polyfit(df[x], y_vals, degree))
-                y_pred = poly(df[x])
-                summary = f"Polynomial regression (deg {degree}): {poly}"
-                model_info = {"poly_coeffs": poly.coefficients.tolist()}
-            ax.scatter(df[x], y_vals, label='Data')
-            ax.plot(df[x], y_pred, color='red', label='Regression')
-            ax.set_title(f'Regression (degree {degree})')
-            ax.legend()
-        # --- Scatter Plot ---
-        elif type == 'scatter':
-            color = params.get('color', 'blue')
-            ax.scatter(df[x], df[y], color=color)
-            ax.set_title('Scatter Plot')
-            summary = f"Scatter plot of {y} vs {x}."
-            model_info = {"color": color}
-        # --- Histogram ---
-        elif type == 'histogram':
-            bins = int(params.get('bins', 10))
-            ax.hist(df[x], bins=bins)
-            ax.set_title('Histogram')
-            summary = f"Histogram of {x} with {bins} bins."
-            model_info = {"bins": bins}
-        # --- Boxplot ---
-        elif type == 'boxplot':
-            by = params.get('by')
-            if by and by in df.columns:
-                df.boxplot(column=y, by=by, ax=ax)
-                summary = f"Boxplot of {y} by {by}."
-                model_info = {"by": by}
-            else:
-                df.boxplot(column=y, ax=ax)
-                summary = f"Boxplot of {y}."
-                model_info = {}
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported ML insight type")
-        buf = BytesIO()
-        plt.tight_layout()
-        plt.savefig(buf, format='png')
-        plt.close(fig)
-        chart_bytes = buf.getvalue()
-        chart_b64 = base64.b64encode(chart_bytes).decode('utf-8')
+                raise HTTPException(status_code=400, detail="Unsupported ML insight type")
+        with stage("render") as s:
+            fig, ax = plt.subplots()
+            if type == 'trend':
+                ax.scatter(df[x], y_vals, label='Data')
+                ax.plot(df[x], y_pred, color='red', label='Trend')
+                ax.set_title('Trend (Linear Regression)')
+                ax.legend()
+            elif type == 'forecast':
+                m.plot(forecast, ax=ax)
+                ax.set_title('Forecast (Prophet)')
+            elif type == 'regression':
+                ax.scatter(df[x], y_vals, label='Data')
+                ax.plot(df[x], y_pred, color='red', label='Regression')
+                ax.set_title(f'Regression (degree {degree})')
+                ax.legend()
+            elif type == 'scatter':
+                ax.scatter(df[x], df[y], color=color)
+                ax.set_title('Scatter Plot')
+            elif type == 'histogram':
+                ax.hist(df[x], bins=bins)
+                ax.set_title('Histogram')
+            elif type == 'boxplot':
+                if by:
+                    df.boxplot(column=y, by=by, ax=ax)
+                else:
+                    df.boxplot(column=y, ax=ax)
+            buf = BytesIO()
+            plt.tight_layout()
+            plt.savefig(buf, format='png')
+            plt.close(fig)
+            chart_bytes = buf.getvalue()
+            s.bytes = len(chart_bytes)
+        with stage("encode", len(chart_bytes)):
+            chart_b64 = base64.b64encode(chart_bytes).decode('utf-8')
         return {
             "chart": chart_b64,
             "model_info": model_info
@@ -345,71 +384,74 @@ def get_available_charts():
 
 # --- Dashboard CRUD (stubs) ---
 @router.post("/dashboards/")
-def create_dashboard(name: str = Body(...), layout: dict = Body({}), db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def create_dashboard(name: str = Body(...), layout: dict = Body({}), db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
     """Create a new dashboard (stub)."""
     return {"id": 1, "name": name, "layout": layout, "insights": []}
 
 @router.get("/dashboards/")
-def list_dashboards(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def list_dashboards(db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
     """List all dashboards for the user (stub)."""
     return []
 
 @router.get("/dashboards/{dashboard_id}")
-def get_dashboard(dashboard_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def get_dashboard(dashboard_id: int, db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
     """Get a dashboard by ID (stub)."""
     return {"id": dashboard_id, "name": "Sample Dashboard", "layout": {}, "insights": []}
 
 @router.put("/dashboards/{dashboard_id}")
-def update_dashboard(dashboard_id: int, name: str = Body(...), layout: dict = Body({}), db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def update_dashboard(dashboard_id: int, name: str = Body(...), layout: dict = Body({}), db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
     """Update a dashboard (stub)."""
     return {"id": dashboard_id, "name": name, "layout": layout}
 
 @router.delete("/dashboards/{dashboard_id}")
-def delete_dashboard(dashboard_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def delete_dashboard(dashboard_id: int, db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
     """Delete a dashboard (stub)."""
     return {"detail": "Dashboard deleted"}
 
 # --- Dataset DELETE Endpoint ---
 @router.delete("/datasets/{dataset_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_dataset(dataset_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    dataset = db.query(Dataset).filter(Dataset.id == dataset_id, Dataset.owner_id == user.id).first()
+def delete_dataset(dataset_id: int, db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
+    dataset = get_owned_dataset(db, dataset_id, user.id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
-    db.delete(dataset)
-    db.commit()
+    with stage("db_write"):
+        db.delete(dataset)
+        db.commit()
     return
 
 # --- Advanced ML/Analytics Stubs ---
 @router.post("/datasets/{dataset_id}/ml_advanced")
-def ml_advanced_stub(dataset_id: int, type: str = Body(...), params: dict = Body({}), db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def ml_advanced_stub(dataset_id: int, type: str = Body(...), params: dict = Body({}), db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
     """Stub for advanced ML/analytics (clustering, classification, anomaly, etc.)."""
     return {"detail": f"ML/analytics type '{type}' not yet implemented. Params: {params}"}
 
 @router.get("/datasets/{dataset_id}/summary")
-def dataset_summary(dataset_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    dataset = db.query(Dataset).filter(Dataset.id == dataset_id, Dataset.owner_id == user.id).first()
+def dataset_summary(dataset_id: int, db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
+    dataset = get_owned_dataset(db, dataset_id, user.id, with_content=True)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
-    df = pd.read_csv(BytesIO(dataset.content))
-    summary = {}
-    for col in df.columns:
-        col_data = df[col].dropna()
-        if col_data.empty:
-            continue
-        stats = {}
-        if pd.api.types.is_numeric_dtype(col_data):
-            stats['mean'] = float(col_data.mean())
-            stats['median'] = float(col_data.median())
-            stats['mode'] = [v.item() if hasattr(v, 'item') else v for v in col_data.mode().values]
-            stats['std'] = float(col_data.std())
-            stats['min'] = float(col_data.min())
-            stats['max'] = float(col_data.max())
-            stats['count'] = int(col_data.count())
-        else:
-            stats['mode'] = [v.item() if hasattr(v, 'item') else v for v in col_data.mode().values]
-            stats['count'] = int(col_data.count())
-            stats['unique'] = int(col_data.nunique())
-        summary[col] = stats
+    with stage("parse", len(dataset.content)):
+        df = pd.read_csv(BytesIO(dataset.content))
+    with stage("compute"):
+        summary = {}
+        for col in df.columns:
+            col_data = df[col].dropna()
+            if col_data.empty:
+                continue
+            stats = {}
+            if pd.api.types.is_numeric_dtype(col_data):
+                stats['mean'] = float(col_data.mean())
+                stats['median'] = float(col_data.median())
+                stats['mode'] = [v.item() if hasattr(v, 'item') else v for v in col_data.mode().values]
+                stats['std'] = float(col_data.std())
+                stats['min'] = float(col_data.min())
+                stats['max'] = float(col_data.max())
+                stats['count'] = int(col_data.count())
+            else:
+                stats['mode'] = [v.item() if hasattr(v, 'item') else v for v in col_data.mode().values]
+                stats['count'] = int(col_data.count())
+                stats['unique'] = int(col_data.nunique())
+            summary[col] = stats
     return summary
 
 # --- Deep Q&A In-memory stores (replace with DB in prod) ---
@@ -442,27 +484,33 @@ def summarize_chunk(chunk):
     return summary
 
 @router.post("/datasets/{dataset_id}/deepqa_prepare")
-def deepqa_prepare(dataset_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def deepqa_prepare(dataset_id: int, db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
     try:
-        dataset = db.query(Dataset).filter(Dataset.id == dataset_id, Dataset.owner_id == user.id).first()
+        dataset = get_owned_dataset(db, dataset_id, user.id, with_content=True)
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset not found")
         try:
-            df = pd.read_csv(BytesIO(dataset.content))
+            with stage("parse", len(dataset.content)):
+                df = pd.read_csv(BytesIO(dataset.content))
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"CSV parse error: {e}")
-        chunks = chunk_dataframe(df)
-        if not chunks:
-            raise HTTPException(status_code=400, detail="Dataset is empty or too small to chunk.")
-        chunk_texts = [summarize_chunk(chunk) for chunk in chunks]
+        with stage("compute"):
+            chunks = chunk_dataframe(df)
+            if not chunks:
+                raise HTTPException(status_code=400, detail="Dataset is empty or too small to chunk.")
+            chunk_texts = [summarize_chunk(chunk) for chunk in chunks]
         try:
-            embeddings = model.encode(chunk_texts, show_progress_bar=True)
+            with stage("embed", sum(len(t.encode("utf-8")) for t in chunk_texts)):
+                embeddings = model.encode(chunk_texts, show_progress_bar=True)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Embedding error: {e}")
         dim = embeddings.shape[1]
         try:
-            index = faiss.IndexFlatL2(dim)
-            index.add(np.array(embeddings, dtype='float32'))
+            with stage("index") as s:
+                index = faiss.IndexFlatL2(dim)
+                vectors = np.array(embeddings, dtype='float32')
+                index.add(vectors)
+                s.bytes = vectors.nbytes
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"FAISS error: {e}")
         dataset_qa_chunks[dataset_id] = {'chunks': chunk_texts, 'embeddings': embeddings}
@@ -477,13 +525,15 @@ class AskRequest(BaseModel):
     question: str
 
 @router.post("/datasets/{dataset_id}/ask_question")
-def ask_question(dataset_id: int, req: AskRequest = Body(...), db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def ask_question(dataset_id: int, req: AskRequest = Body(...), db: Session = Depends(get_db), user: UserRead = Depends(get_current_user)):
     try:
         if dataset_id not in dataset_qa_chunks or dataset_id not in faiss_indexes:
             raise HTTPException(status_code=400, detail="Deep Q&A not prepared for this dataset. Call /deepqa_prepare first.")
-        question_emb = model.encode([req.question])[0]
+        with stage("embed", len(req.question.encode("utf-8"))):
+            question_emb = model.encode([req.question])[0]
         index = faiss_indexes[dataset_id]
-        D, I = index.search(np.array([question_emb], dtype='float32'), TOP_K)
+        with stage("search"):
+            D, I = index.search(np.array([question_emb], dtype='float32'), TOP_K)
         chunk_texts = dataset_qa_chunks[dataset_id]['chunks']
         selected_chunks = [chunk_texts[i] for i in I[0]]
         prompt = (
@@ -494,14 +544,15 @@ def ask_question(dataset_id: int, req: AskRequest = Body(...), db: Session = Dep
         )
         openai.api_key = OPENAI_API_KEY
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "system", "content": "You are a helpful data analyst."},
-                          {"role": "user", "content": prompt}],
-                max_tokens=512,
-                temperature=0.2
-            )
-            answer = response.choices[0].message.content.strip()
+            with stage("llm", len(prompt.encode("utf-8"))):
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=[{"role": "system", "content": "You are a helpful data analyst."},
+                              {"role": "user", "content": prompt}],
+                    max_tokens=512,
+                    temperature=0.2
+                )
+                answer = response.choices[0].message.content.strip()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"OpenAI error: {e}")
         return {"answer": answer, "context_chunks": selected_chunks}
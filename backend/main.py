@@ -1,19 +1,41 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from auth_routes import router as auth_router
 from models import Base
 from database import engine
 from dataset_routes import router as dataset_router
+import metrics
 
 app = FastAPI()
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    tokens = metrics.begin_request(request.scope)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        stages = metrics.end_request(tokens)
+        # Routing has filled in the scope by now.
+        metrics.REQUEST_LATENCY.observe(elapsed, request.method, metrics.route_template(request.scope), str(status_code))
+    if request.headers.get(metrics.PROFILE_HEADER, "").strip().lower() in metrics.PROFILE_HEADER_ON:
+        response.headers["Server-Timing"] = metrics.server_timing(stages, elapsed)
+    return response
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Use your frontend URL, not "*"
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Total-Count"],
 )
 
 Base.metadata.create_all(bind=engine)
@@ -24,3 +46,8 @@ app.include_router(dataset_router, prefix="/data", tags=["data"])
 @app.get("/")
 def read_root():
     return {"message": "InsightIQ backend is running!"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Prometheus text exposition of request and per-stage latency histograms."""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
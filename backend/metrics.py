@@ -0,0 +1,207 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import Scope
+
+# Latency buckets (seconds) shared by request and stage histograms.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Request header that opts a single request into a stage breakdown (Server-Timing response header).
+PROFILE_HEADER = "x-profile"
+PROFILE_HEADER_ON = ("1", "true")
+
+
+class Histogram:
+    """Minimal thread-safe Prometheus histogram keyed by a fixed tuple of label names."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # labels: [bucket_counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if idx < len(self.buckets):
+                series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            base = _format_labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_join_labels(base, _le(bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_join_labels(base, _le('+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_wrap(base)} {total}")
+            lines.append(f"{self.name}_count{_wrap(base)} {count}")
+        return lines
+
+
+class Counter:
+    """Minimal thread-safe Prometheus counter keyed by a fixed tuple of label names."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for labels, value in snapshot:
+            lines.append(f"{self.name}{_wrap(_format_labels(self.labelnames, labels))} {value}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _le(bound) -> str:
+    return 'le="' + str(bound) + '"'
+
+
+def _join_labels(base: str, extra: str) -> str:
+    return "{" + (f"{base},{extra}" if base else extra) + "}"
+
+
+def _wrap(base: str) -> str:
+    return "{" + base + "}" if base else ""
+
+
+REQUEST_LATENCY = Histogram(
+    "insightiq_request_duration_seconds",
+    "HTTP request latency in seconds.",
+    ("method", "route", "status"),
+)
+STAGE_LATENCY = Histogram(
+    "insightiq_stage_duration_seconds",
+    "Latency of an instrumented request stage in seconds.",
+    ("route", "stage"),
+)
+STAGE_BYTES = Counter(
+    "insightiq_stage_bytes_total",
+    "Bytes processed by an instrumented request stage.",
+    ("route", "stage"),
+)
+
+# Per-request profile: list of (stage, seconds, bytes), or None outside a request.
+_profile: ContextVar[Optional[list]] = ContextVar("insightiq_profile", default=None)
+_scope: ContextVar[Optional[Scope]] = ContextVar("insightiq_scope", default=None)
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Label a routed request by its path template, e.g. /data/datasets/{dataset_id}/preview,
+    so metric cardinality stays bounded. Requests that matched no route are "unmatched".
+    """
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if "endpoint" not in scope or path_format is None:
+        return "unmatched"
+    cached = scope.get("insightiq.route")
+    if cached is None:
+        # path_format may omit an include_router prefix; take that prefix from the concrete path
+        # by aligning the template with the path's trailing segments.
+        tail = path_format.split("/")[1:]
+        segments = scope["path"].split("/")
+        if len(tail) < len(segments):
+            cached = "/".join(segments[:len(segments) - len(tail)] + tail)
+        else:
+            cached = path_format
+        scope["insightiq.route"] = cached
+    return cached
+
+
+class _Stage:
+    __slots__ = ("name", "bytes")
+
+    def __init__(self, name: str, nbytes: Optional[int]):
+        self.name = name
+        self.bytes = nbytes
+
+
+@contextmanager
+def stage(name: str, nbytes: Optional[int] = None):
+    """
+    Time a block of work as a named stage. Set `.bytes` on the yielded object
+    (or pass `nbytes`) to also record how many bytes the stage handled.
+    """
+    record = _Stage(name, nbytes)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        scope = _scope.get()
+        route = route_template(scope) if scope is not None else ""
+        STAGE_LATENCY.observe(elapsed, route, name)
+        if record.bytes is not None:
+            STAGE_BYTES.inc(record.bytes, route, name)
+        profile = _profile.get()
+        if profile is not None:
+            profile.append((name, elapsed, record.bytes))
+
+
+def begin_request(scope: Scope):
+    """Start collecting stages for the current request; returns tokens for `end_request`."""
+    return _scope.set(scope), _profile.set([])
+
+
+def end_request(tokens) -> list:
+    """Stop collecting stages for the current request and return them."""
+    scope_token, profile_token = tokens
+    stages = _profile.get() or []
+    _profile.reset(profile_token)
+    _scope.reset(scope_token)
+    return stages
+
+
+def server_timing(stages: list, total: float) -> str:
+    """Format collected stages as a Server-Timing header value (durations in ms)."""
+    parts = []
+    seen: Dict[str, int] = {}
+    for name, elapsed, nbytes in stages:
+        # Repeated stage names collapse in most viewers; suffix them to keep them distinct.
+        seen[name] = seen.get(name, 0) + 1
+        entry = name if seen[name] == 1 else f"{name}_{seen[name]}"
+        entry += f";dur={elapsed * 1000:.2f}"
+        if nbytes is not None:
+            entry += f';desc="bytes={nbytes}"'
+        parts.append(entry)
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in (REQUEST_LATENCY, STAGE_LATENCY, STAGE_BYTES):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
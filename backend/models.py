@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, LargeBinary, DateTime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 
 Base = declarative_base()
@@ -18,9 +18,10 @@ class Dataset(Base):
     __tablename__ = "datasets"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    content = Column(LargeBinary, nullable=False)
+    # Raw CSV bytes; deferred so metadata queries never pull the blob. Load with undefer(Dataset.content).
+    content = deferred(Column(LargeBinary, nullable=False))
     uploaded_at = Column(DateTime, default=datetime.utcnow)
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
     owner = relationship("User", back_populates="datasets")
     insights = relationship("Insight", back_populates="dataset")
 
@@ -28,7 +29,8 @@ class Insight(Base):
     __tablename__ = "insights"
     id = Column(Integer, primary_key=True, index=True)
     summary = Column(String, nullable=True)
-    chart = Column(LargeBinary, nullable=True)
+    # PNG bytes; deferred like Dataset.content. Load with undefer(Insight.chart).
+    chart = deferred(Column(LargeBinary, nullable=True))
     config = Column(String, nullable=True)
-    dataset_id = Column(Integer, ForeignKey("datasets.id"))
+    dataset_id = Column(Integer, ForeignKey("datasets.id"), index=True)
     dataset = relationship("Dataset", back_populates="insights")
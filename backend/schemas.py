@@ -26,6 +26,7 @@ class DatasetRead(BaseModel):
     id: int
     name: str
     uploaded_at: datetime
+    size_bytes: Optional[int] = None
     class Config:
         from_attributes = True
 